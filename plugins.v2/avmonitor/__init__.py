@@ -1,10 +1,19 @@
+import bisect
 import datetime
+import errno
+import functools
+import os
+import queue
 import re
 import threading
+import time
 import traceback
 import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple, Dict, Any, Optional
+from weakref import WeakValueDictionary
+from typing import List, Tuple, Dict, Any, Optional, Iterator, Set
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -22,25 +31,69 @@ from app.schemas import NotificationType
 from app.schemas.types import EventType
 from app.utils.system import SystemUtils
 
-lock = threading.Lock()
+# 排除路径：回收站、隐藏目录、群晖缩略图目录
+_EXCLUDE_RE = re.compile(r'/(?:@Recycle/|#recycle/|\.|@eaDir)')
+# 番号：支持 FC2-PPV, FC2-1234, 常规番号
+_AV_RE = re.compile(r'^([a-z0-9]+(?:-ppv)?)-?(\d+)', re.I)
+# 5文件就绪位：strm | nfo | poster | fanart | thumb
+_STRM_BIT, _NFO_BIT = 1, 2
+_IMG_BITS = {'poster.jpg': 4, 'fanart.jpg': 8, 'thumb.jpg': 16}
+_REQUIRED = 0b11111
+# 不支持 inotify 的网络/远程文件系统，需回退到轮询
+_NETWORK_FS_TYPES = {"cifs", "smb3", "smbfs", "nfs", "nfs4", "fuse.rclone", "fuse.sshfs"}
+
+
+@functools.lru_cache(maxsize=4096)
+def _first_char(av_name: str) -> str:
+    """番号首字母分类，无法识别的归入“其他”"""
+    match = _AV_RE.match(av_name)
+    return match.group(1)[0].upper() if match else "其他"
+
+
+def _list_subdirs(base) -> Iterator[os.DirEntry]:
+    """列出一级子目录，DirEntry 直接使用 getdents 返回的类型，普通目录无需额外 stat"""
+    with os.scandir(base) as it:
+        for entry in it:
+            if entry.is_dir():
+                yield entry
+
+
+def _get_fs_type(path: str) -> Optional[str]:
+    """按最长前缀匹配 /proc/self/mountinfo，返回路径所在挂载点的文件系统类型"""
+    path = os.path.realpath(path)
+    best, fs_type = "", None
+    try:
+        with open("/proc/self/mountinfo", encoding="utf-8") as f:
+            for line in f:
+                left, _, right = line.partition(" - ")
+                mount_point = left.split()[4].replace("\\040", " ")
+                if path != mount_point and not path.startswith(mount_point.rstrip("/") + "/"):
+                    continue
+                if len(mount_point) >= len(best):
+                    best, fs_type = mount_point, right.split()[0]
+    except (OSError, IndexError):
+        return None
+    return fs_type
+
 
 class FileMonitorHandler(FileSystemEventHandler):
     """
-    文件监控事件处理器
+    文件监控事件处理器，所有监控路径共用，由插件按路径前缀分发
     """
-    def __init__(self, monpath: str, sync: Any, **kwargs):
+    def __init__(self, sync: Any, **kwargs):
         super(FileMonitorHandler, self).__init__(**kwargs)
-        self._watch_path = monpath
         self.sync = sync
 
     def on_created(self, event):
-        self.sync.event_handler(event=event, text="创建", mon_path=self._watch_path, event_path=event.src_path)
+        self.sync.event_handler(event=event, text="创建", event_path=event.src_path)
 
     def on_moved(self, event):
-        self.sync.event_handler(event=event, text="移动", mon_path=self._watch_path, event_path=event.dest_path)
+        # 移动 = 删除源路径 + 创建目标路径
+        self.sync.event_handler(event=event, text="移动", event_path=event.src_path, is_delete=True)
+        self.sync.event_handler(event=event, text="移动", event_path=event.dest_path)
 
     def on_deleted(self, event):
-        self.sync.event_handler(event=event, text="删除", mon_path=self._watch_path, event_path=event.src_path, is_delete=True)
+        self.sync.event_handler(event=event, text="删除", event_path=event.src_path, is_delete=True)
 
 
 class AvMonitor(_PluginBase):
@@ -50,7 +103,7 @@ class AvMonitor(_PluginBase):
     plugin_name = "AV实时硬链接测试"
     plugin_desc = "监控目录文件变化，实时硬链接。"
     plugin_icon = "Linkace_C.png"
-    plugin_version = "1.0.1"
+    plugin_version = "1.0.2"
     plugin_author = "fanxing"
     author_url = "https://github.com/fanxing-oai"
     plugin_config_prefix = "avmonitor_"
@@ -67,12 +120,26 @@ class AvMonitor(_PluginBase):
     _cron = None
     _monitor_dirs = ""
     _mode = "fast"
+    _debounce_ms = 250                  # 事件合并窗口
+    _event_queue: Optional[queue.Queue] = None
     
     # 路径映射与缓存
     _dirconf: Dict[str, Path] = {}      # 源 -> 目的
     _rev_dirconf: Dict[str, Path] = {}  # 目的 -> 源
-    _synced_folders = set()             # 内存缓存，防止重复处理
+    _samedev: Dict[str, bool] = {}      # 源 -> 是否与目的在同一设备
+    _watch_roots: List[Tuple[str, str]] = []  # (带 / 结尾的前缀, 映射路径)，按前缀排序
+    _synced_snapshot: frozenset = frozenset()  # 已处理目录快照，只读，整体替换发布
+    _synced_pending = deque()                  # 待合并变更 (目录, 是否已同步)，目录为 None 表示清空
+    _folder_state: Dict[str, dict] = {} # 番号目录 -> 5文件就绪状态，由事件增量更新
+    _actor_cache: Dict[str, Tuple[int, List[str]]] = {}   # 基础目录 -> (mtime_ns, 子目录列表)
+    _made_letter_dirs: Set[Tuple[str, str]] = set()       # 已创建的 (目的目录, 首字母) 分类目录
     _event = threading.Event()
+    # 按目录加锁，不相关的番号目录互不阻塞；锁用完即被回收
+    _folder_locks: "WeakValueDictionary[str, threading.Lock]" = WeakValueDictionary()
+    _locks_lock = threading.Lock()
+    _merge_lock = threading.Lock()
+    _sync_lock = threading.Lock()       # 全量同步单例锁，防止重复触发并发执行
+    _sync_workers = 16                  # 全量同步并发数
 
     def init_plugin(self, config: dict = None):
         """
@@ -80,7 +147,13 @@ class AvMonitor(_PluginBase):
         """
         self._dirconf = {}
         self._rev_dirconf = {}
-        self._synced_folders.clear()
+        self._samedev = {}
+        self._watch_roots = []
+        self._synced_snapshot = frozenset()
+        self._synced_pending = deque()
+        self._folder_state = {}
+        self._actor_cache = {}
+        self._made_letter_dirs = set()
         
         if config:
             self._enabled = config.get("enabled")
@@ -93,6 +166,13 @@ class AvMonitor(_PluginBase):
         self.stop_service()
 
         if self._enabled or self._onlyonce:
+            if self._enabled:
+                # 实时监控时定时合并已处理目录快照；仅执行一次全量同步时由 sync_all 自行合并
+                self._scheduler = BackgroundScheduler(timezone=settings.TZ)
+                self._scheduler.add_job(func=self.__merge_synced, trigger='interval', seconds=1)
+                self._scheduler.start()
+
+            watch_targets = []
             monitor_dirs = self._monitor_dirs.split("\n")
             for mon_path in monitor_dirs:
                 if ":" not in mon_path:
@@ -113,139 +193,409 @@ class AvMonitor(_PluginBase):
                 
                 self._dirconf[m_path] = t_path
                 self._rev_dirconf[str(t_path)] = Path(m_path)
+                try:
+                    self._samedev[m_path] = os.stat(m_path).st_dev == os.stat(t_path).st_dev
+                except OSError:
+                    self._samedev[m_path] = False
 
                 if self._enabled:
-                    # 启动双向监控：源目录 & 目的目录
+                    if not self._event_queue:
+                        # 事件统一入队，由单独线程按目录合并处理
+                        self._event_queue = queue.Queue()
+                        threading.Thread(target=self.__event_worker, args=(self._event_queue,), daemon=True).start()
+                    # 双向监控：源目录 & 目的目录
                     for target in [m_path, str(t_path)]:
-                        try:
-                            # 再次检查路径是否存在
-                            if not Path(target).exists():
-                                logger.error(f"【AV助手】路径不存在，跳过监控: {target}")
-                                continue
-
-                            observer = PollingObserver(timeout=10) if self._mode == "compatibility" else Observer(timeout=10)
-                            self._observer.append(observer)
-                            observer.schedule(FileMonitorHandler(target, self), path=target, recursive=True)
-                            observer.start()
-                            logger.info(f"【AV助手】已启动监控: {target}")
-                        except Exception as e:
-                            logger.error(f"【AV助手】监控启动失败 {target}: {str(e)}")
+                        # 再次检查路径是否存在
+                        if not Path(target).exists():
+                            logger.error(f"【AV助手】路径不存在，跳过监控: {target}")
+                            continue
+                        watch_targets.append(target)
+
+            if watch_targets:
+                self.__start_monitor(watch_targets)
 
             if self._onlyonce:
-                threading.Thread(target=self.sync_all).start()
+                threading.Thread(target=self._safe_sync_all, daemon=True).start()
                 self._onlyonce = False
                 self.update_config({"onlyonce": False})
 
-    def event_handler(self, event, mon_path: str, text: str, event_path: str, is_delete: bool = False):
-        if is_delete:
-            self.__handle_delete(event_path, mon_path)
-            return
-        if event.is_directory:
-            return
-
-        # 逻辑分流
-        if mon_path in self._dirconf:
-            self.__handle_src_file(event_path, mon_path)
-        elif mon_path in self._rev_dirconf:
-            self.__handle_dest_file(event_path, mon_path)
-
-    def __handle_src_file(self, event_path: str, mon_path: str):
-        """源目录处理：5文件检查 + 正则分拣"""
-        file_path = Path(event_path)
-        av_folder = file_path.parent
-        
+    def __start_monitor(self, targets: List[str]):
+        """
+        所有路径共用一个处理器和一个 inotify 监控，兼容模式或网络文件系统使用轮询监控；
+        已被其它监控路径递归覆盖的子路径不再重复注册
+        """
+        self._watch_roots = sorted((t.rstrip('/') + '/', t) for t in targets)
+        handler = FileMonitorHandler(self)
+        observer = poll_observer = None
+        scheduled: List[Tuple[str, bool]] = []
+        # 按前缀排序后父目录总在子目录之前
+        for prefix, target in self._watch_roots:
+            try:
+                poll = self._mode == "compatibility" or _get_fs_type(target) in _NETWORK_FS_TYPES
+                if any(prefix.startswith(p) and poll == q for p, q in scheduled):
+                    logger.info(f"【AV助手】已由上级目录监控覆盖: {target}")
+                    continue
+                if poll:
+                    if not poll_observer:
+                        poll_observer = PollingObserver(timeout=10)
+                        poll_observer.start()
+                        self._observer.append(poll_observer)
+                    obs = poll_observer
+                else:
+                    if not observer:
+                        observer = Observer(timeout=10)
+                        observer.start()
+                        self._observer.append(observer)
+                    obs = observer
+                obs.schedule(handler, path=target, recursive=True)
+                scheduled.append((prefix, poll))
+                logger.info(f"【AV助手】已启动监控: {target}")
+            except Exception as e:
+                logger.error(f"【AV助手】监控启动失败 {target}: {str(e)}")
+
+    def __match_root(self, event_path: str) -> Optional[str]:
+        """二分查找事件路径所属的最长监控前缀，返回对应映射路径"""
+        path = event_path + '/'
+        i = bisect.bisect_right(self._watch_roots, path, key=lambda r: r[0])
+        while i > 0:
+            i -= 1
+            prefix, mon_path = self._watch_roots[i]
+            if path.startswith(prefix):
+                return mon_path
+        return None
+
+    def event_handler(self, event, text: str, event_path: str, is_delete: bool = False):
+        mon_path = self.__match_root(event_path)
+        if mon_path and self._event_queue:
+            self._event_queue.put((mon_path, event_path, is_delete, event.is_directory))
+
+    def __event_worker(self, events: queue.Queue):
+        """事件合并线程：防抖窗口内的事件按所在目录去重合并后统一处理，目录事件归入目录自身，与其中的文件同批处理"""
+        while True:
+            item = events.get()
+            if item is None: return
+            pending: Dict[str, Dict[str, List[tuple]]] = {}
+            deadline = time.monotonic() + self._debounce_ms / 1000
+            while item is not None:
+                # 同一路径合并为：创建 / 删除 / 删除后重新创建，删除不会被随后的创建覆盖
+                folder_events = pending.setdefault(item[1] if item[3] else item[1].rpartition('/')[0], {})
+                path_events = folder_events.get(item[1])
+                if item[2] or path_events is None:
+                    folder_events.pop(item[1], None)
+                    folder_events[item[1]] = [item]
+                elif path_events[-1][2]:
+                    path_events.append(item)
+                else:
+                    path_events[-1] = item
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                try:
+                    item = events.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            for folder, folder_events in pending.items():
+                try:
+                    self.__dispatch_events(folder, [e for path_events in folder_events.values() for e in path_events])
+                except Exception as e:
+                    logger.error(f"【AV助手】处理事件失败 {folder}: {e} - {traceback.format_exc()}")
+            if item is None: return
+
+    def __dispatch_events(self, folder: str, folder_events: List[tuple]):
+        """逻辑分流：源目录文件与新建/移入的目录合并为一次检查，其余逐个处理"""
+        src_paths = []
+        src_mon_path = None
+        rescan = False
+        for mon_path, event_path, is_delete, is_directory in folder_events:
+            if is_delete:
+                if mon_path in self._dirconf:
+                    self.__clear_folder_state(event_path, is_directory)
+                self.__handle_delete(event_path, mon_path, is_directory)
+                if is_directory:
+                    # 同一批次内可能紧跟着重新创建，立即合并快照，避免新目录被当作已处理而跳过
+                    self.__merge_synced()
+            elif is_directory:
+                # 移入或新建的目录：丢弃旧缓存，重新检查整个目录
+                if mon_path in self._dirconf:
+                    rescan = True
+                    src_mon_path = mon_path
+            elif mon_path in self._dirconf:
+                src_paths.append(event_path)
+                src_mon_path = mon_path
+            elif mon_path in self._rev_dirconf:
+                self.__handle_dest_file(event_path, mon_path)
+        if src_paths or rescan:
+            self.__handle_src_folder(folder, src_paths, src_mon_path, rescan)
+
+    def _get_lock(self, key: str) -> threading.Lock:
+        with self._locks_lock:
+            lk = self._folder_locks.get(key)
+            if lk is None:
+                lk = threading.Lock()
+                self._folder_locks[key] = lk
+            return lk
+
+    def __handle_src_folder(self, folder: str, event_paths: List[str], mon_path: str, rescan: bool = False):
+        """源目录处理：同一番号目录下的一批文件事件只做一次检查，rescan 时丢弃缓存重新扫描整个目录"""
         # 缓存检查
-        if str(av_folder) in self._synced_folders: return
-        if any(x in event_path for x in ['/@Recycle/', '/#recycle/', '/.', '/@eaDir']): return
-
-        with lock:
-            if not av_folder.exists(): return
-            files = [f.name.lower() for f in av_folder.iterdir() if f.is_file()]
-            
-            # 5文件校验
-            has_strm = any(f.endswith('.strm') for f in files)
-            has_nfo = any(f.endswith('.nfo') for f in files)
-            has_imgs = all(img in files for img in ['poster.jpg', 'fanart.jpg', 'thumb.jpg'])
-
-            if has_strm and has_nfo and has_imgs:
+        if folder in self._synced_snapshot: return
+        if _EXCLUDE_RE.search(folder + '/'): return
+        file_paths = [p for p in event_paths if not _EXCLUDE_RE.search(p)]
+        if not rescan and not file_paths: return
+
+        with self._get_lock(folder):
+            state = None if rescan else self._folder_state.get(folder)
+            if state is None:
+                # 首次遇到该目录：扫描一次建立缓存（已包含当前文件）
+                state = self.__seed_folder_state(folder)
+                if state is None: return
+            else:
+                for event_path in file_paths:
+                    self.__update_folder_state(state, event_path.rpartition('/')[2])
+
+            # 5文件校验 + 同名校验
+            if self.__is_folder_ready(state):
                 try:
-                    strm_f = next(av_folder.glob('*.strm'))
-                    nfo_f = next(av_folder.glob('*.nfo'))
-                    # 同名校验
-                    if strm_f.stem.lower() == nfo_f.stem.lower():
-                        if self._process_forward_link(av_folder, mon_path):
-                            self._synced_folders.add(str(av_folder))
+                    if self._process_forward_link(Path(folder), mon_path):
+                        self._synced_pending.append((folder, True))
+                        self._folder_state.pop(folder, None)
                 except Exception:
                     pass
 
+    @staticmethod
+    def __new_folder_state() -> dict:
+        return {"mask": 0, "strm": None, "nfo": None}
+
+    @staticmethod
+    def __update_folder_state(state: dict, file_name: str, present: bool = True):
+        """按单个文件名更新目录就绪状态，不访问文件系统"""
+        name = file_name.lower()
+        if name.endswith('.strm'):
+            bit, key, stem = _STRM_BIT, "strm", name[:-5]
+        elif name.endswith('.nfo'):
+            bit, key, stem = _NFO_BIT, "nfo", name[:-4]
+        else:
+            bit = _IMG_BITS.get(name)
+            if bit:
+                state["mask"] = state["mask"] | bit if present else state["mask"] & ~bit
+            return
+        if present:
+            state[key] = stem
+            state["mask"] |= bit
+        elif state[key] == stem:
+            state[key] = None
+            state["mask"] &= ~bit
+
+    @staticmethod
+    def __is_folder_ready(state: dict) -> bool:
+        return state["mask"] == _REQUIRED and state["strm"] == state["nfo"]
+
+    def __seed_folder_state(self, av_folder: str) -> Optional[dict]:
+        """目录首次出现时扫描一次，5个文件到齐即停止读取，之后仅靠事件增量更新"""
+        state = self.__new_folder_state()
+        try:
+            with os.scandir(av_folder) as it:
+                for entry in it:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    self.__update_folder_state(state, entry.name)
+                    if state["mask"] == _REQUIRED:
+                        break
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        self._folder_state[av_folder] = state
+        return state
+
+    def __pop_folder_state(self, folder: str):
+        with self._get_lock(folder):
+            return self._folder_state.pop(folder, None)
+
+    def __clear_folder_state(self, event_path: str, is_directory: bool = False):
+        """删除/移出事件：目录则丢弃其自身及子目录的缓存，文件则清除对应槽位"""
+        if is_directory:
+            prefix = event_path + '/'
+            for key in list(self._folder_state):
+                if key == event_path or key.startswith(prefix):
+                    self.__pop_folder_state(key)
+            return
+        if self.__pop_folder_state(event_path) is not None:
+            return
+        folder, _, file_name = event_path.rpartition('/')
+        with self._get_lock(folder):
+            state = self._folder_state.get(folder)
+            if state:
+                self.__update_folder_state(state, file_name, present=False)
+
     def _process_forward_link(self, av_folder: Path, mon_path: str) -> bool:
         """正向硬链接逻辑"""
         target_base = self._dirconf.get(mon_path)
         av_name = av_folder.name
         
-        # 正则增强：支持 FC2-PPV, FC2-1234, 常规番号
-        match = re.match(r'^([a-zA-Z0-9]+(?:-PPV)?)-?(\d+)', av_name, re.I)
-        first_char = match.group(1)[0].upper() if match else "其他"
+        first_char = _first_char(av_name)
         
         dest_folder = target_base / first_char / av_name
-        dest_folder.mkdir(parents=True, exist_ok=True)
+        letter_key = (str(target_base), first_char)
+        if letter_key not in self._made_letter_dirs:
+            (target_base / first_char).mkdir(parents=True, exist_ok=True)
+            self._made_letter_dirs.add(letter_key)
+        try:
+            dest_folder.mkdir(exist_ok=True)
+        except FileNotFoundError:
+            # 分类目录已被外部删除，重新创建
+            dest_folder.mkdir(parents=True, exist_ok=True)
         
         success = True
-        for item in av_folder.glob('*'):
-            if item.is_file():
-                dest_item = dest_folder / item.name
+        samedev = self._samedev.get(mon_path)
+        with os.scandir(av_folder) as it:
+            for entry in it:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                dest_item = dest_folder / entry.name
+                if samedev:
+                    # 同一设备：直接 link(2)
+                    try:
+                        os.link(entry.path, dest_item)
+                        continue
+                    except FileExistsError:
+                        continue
+                    except OSError as e:
+                        # 同一文件系统的不同挂载点（如多个 Docker 卷）st_dev 相同，但 link(2) 仍会返回 EXDEV，
+                        # 此时无法硬链接，标记失败，之后不再按同一设备处理
+                        if e.errno == errno.EXDEV:
+                            samedev = self._samedev[mon_path] = False
+                        success = False
+                        logger.error(f"【AV助手】硬链接失败 {entry.path}: {e}")
+                        continue
                 if not dest_item.exists():
-                    res, _ = SystemUtils.link(item, dest_item)
-                    if res != 0: success = False
+                    res, msg = SystemUtils.link(Path(entry.path), dest_item)
+                    if res != 0:
+                        success = False
+                        logger.error(f"【AV助手】硬链接失败 {entry.path}: {msg}")
         return success
 
+    def __merge_synced(self):
+        """将待合并变更并入新的快照；写入方之间加锁，读取方无需加锁"""
+        if not self._synced_pending: return
+        with self._merge_lock:
+            snapshot = set(self._synced_snapshot)
+            while self._synced_pending:
+                path, synced = self._synced_pending.popleft()
+                if path is None: snapshot.clear()
+                elif synced: snapshot.add(path)
+                else: snapshot.discard(path)
+            self._synced_snapshot = frozenset(snapshot)
+
+    def _list_actor_dirs(self, base: Path, refresh: bool = False) -> List[str]:
+        """列出基础目录下的一级子目录，目录 mtime 未变时直接复用缓存"""
+        st = base.stat().st_mtime_ns
+        entry = self._actor_cache.get(str(base))
+        if not refresh and entry and entry[0] == st:
+            return entry[1]
+        dirs = [e.path for e in _list_subdirs(base)]
+        self._actor_cache[str(base)] = (st, dirs)
+        return dirs
+
+    def _find_in_actor_dirs(self, base: Path, name: str) -> List[str]:
+        """
+        在基础目录的各子目录下查找同名条目；
+        缓存列表中找不到时重新列一次，避免 mtime 精度不足（SMB/NFS 属性缓存、FAT 等）导致漏掉新目录
+        """
+        for refresh in (False, True):
+            found = [p for p in (os.path.join(d, name) for d in self._list_actor_dirs(base, refresh))
+                     if os.path.exists(p)]
+            if found:
+                return found
+        return []
+
     def __handle_dest_file(self, event_path: str, mon_path: str):
         """反向回传 JSON"""
-        if not event_path.lower().endswith('.json'):
+        if event_path[-5:].lower() != '.json':
             return
-        dest_file = Path(event_path)
+        dest_folder, _, file_name = event_path.rpartition('/')
         src_base = self._rev_dirconf.get(mon_path)
-        av_name = dest_file.parent.name
+        av_name = dest_folder.rpartition('/')[2]
         
-        with lock:
+        with self._get_lock(dest_folder):
             if src_base and src_base.exists():
                 # 遍历源目录下的演员目录寻找对应番号
-                for actor_dir in [d for d in src_base.iterdir() if d.is_dir()]:
-                    target_path = actor_dir / av_name
-                    if target_path.exists():
-                        back_link = target_path / dest_file.name
-                        if not back_link.exists():
-                            SystemUtils.link(dest_file, back_link)
-                            logger.info(f"【AV助手】JSON回传: {av_name}")
-                        return
-
-    def __handle_delete(self, event_path: str, mon_path: str):
-        if mon_path not in self._dirconf: return
+                for target_path in self._find_in_actor_dirs(src_base, av_name):
+                    back_link = Path(target_path, file_name)
+                    if not back_link.exists():
+                        SystemUtils.link(Path(event_path), back_link)
+                        logger.info(f"【AV助手】JSON回传: {av_name}")
+                    return
+
+    def __handle_delete(self, event_path: str, mon_path: str, is_directory: bool):
+        # 目的端只按番号目录整体链接，单个文件删除无需查找
+        if mon_path not in self._dirconf or not is_directory: return
         target_base = self._dirconf.get(mon_path)
-        p_name = Path(event_path).name
-        if event_path in self._synced_folders:
-            self._synced_folders.remove(event_path)
+        p_name = event_path.rpartition('/')[2]
+        # 无条件排队：刚链接、尚未合并进快照的目录也要按顺序移除
+        self._synced_pending.append((event_path, False))
         
         if target_base and target_base.exists():
-            for sub in [d for d in target_base.iterdir() if d.is_dir()]:
-                t_path = sub / p_name
-                if t_path.exists():
-                    if t_path.is_dir(): shutil.rmtree(t_path)
-                    else: t_path.unlink()
+            for t_path in self._find_in_actor_dirs(target_base, p_name):
+                if os.path.isdir(t_path): self._fast_rm_leaf_dir(t_path)
+                else: os.unlink(t_path)
+
+    @staticmethod
+    def _fast_rm_leaf_dir(p: str):
+        """删除只含硬链接文件的番号目录，遇到子目录时回退到 shutil.rmtree"""
+        with os.scandir(p) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    break
+                os.unlink(entry.path)
+            else:
+                os.rmdir(p)
+                return
+        shutil.rmtree(p)
+
+    def _safe_sync_all(self):
+        """全量同步入口：已有同步在运行时直接忽略"""
+        if not self._sync_lock.acquire(blocking=False):
+            logger.info("【AV助手】已在同步中，忽略重复触发")
+            return
+        try:
+            self.sync_all()
+        finally:
+            self._sync_lock.release()
 
     def sync_all(self):
         logger.info("【AV助手】启动全量同步...")
-        self._synced_folders.clear()
-        for m_path in self._dirconf.keys():
-            root = Path(m_path)
-            if not root.exists(): continue
-            for actor in [d for d in root.iterdir() if d.is_dir()]:
-                for av in [d for d in actor.iterdir() if d.is_dir()]:
-                    sample = next(av.glob('*.strm'), None)
-                    if sample:
-                        self.__handle_src_file(str(sample), m_path)
+        # 立即清空快照，确保已处理过的目录也会重新检查
+        self._synced_pending.append((None, False))
+        self.__merge_synced()
+        for folder in list(self._folder_state):
+            self.__pop_folder_state(folder)
+        self._made_letter_dirs.clear()
+        with ThreadPoolExecutor(max_workers=self._sync_workers) as ex:
+            futs = []
+            for m_path in self._dirconf.keys():
+                root = Path(m_path)
+                if not root.exists(): continue
+                # 每个演员目录一个任务，番号目录的遍历与检查都在线程池中进行
+                for actor in self._list_actor_dirs(root, refresh=True):
+                    futs.append(ex.submit(self.__sync_actor, actor, m_path))
+            for f in futs:
+                try:
+                    f.result()
+                except Exception as e:
+                    logger.error(f"【AV助手】同步失败: {e}")
         logger.info("【AV助手】全量同步完成")
 
+    def __sync_actor(self, actor: str, mon_path: str):
+        """同步单个演员目录下的所有番号目录，单个目录无法读取时跳过"""
+        try:
+            av_folders = [e.path for e in _list_subdirs(actor)]
+        except OSError as e:
+            logger.warning(f"【AV助手】跳过无法读取的目录 {actor}: {e}")
+            return
+        for av_folder in av_folders:
+            try:
+                self.__handle_src_folder(av_folder, [], mon_path, rescan=True)
+            except OSError as e:
+                logger.warning(f"【AV助手】跳过无法读取的目录 {av_folder}: {e}")
+
     # =========================================================
     # 🔴 关键修复区：抽象接口实现 & 配置持久化
     # =========================================================
@@ -261,7 +611,7 @@ class AvMonitor(_PluginBase):
         """API接口定义 (修复 TypeError)"""
         return [{
             "path": "/sync",
-            "endpoint": self.sync_all,
+            "endpoint": self._safe_sync_all,
             "methods": ["GET"],
             "summary": "手动同步",
             "description": "触发全量同步任务"
@@ -279,7 +629,7 @@ class AvMonitor(_PluginBase):
     @eventmanager.register(EventType.PluginAction)
     def remote_action(self, event: Event):
         if event.event_data.get("action") == "sync":
-            self.sync_all()
+            self._safe_sync_all()
 
     def get_service(self) -> List[Dict[str, Any]]:
         if self._enabled and self._cron:
@@ -287,7 +637,7 @@ class AvMonitor(_PluginBase):
                 "id": "AvMonitorTask",
                 "name": "AV全量同步",
                 "trigger": CronTrigger.from_crontab(self._cron),
-                "func": self.sync_all,
+                "func": self._safe_sync_all,
                 "kwargs": {}
             }]
         return []
@@ -389,10 +739,22 @@ class AvMonitor(_PluginBase):
         }
 
     def stop_service(self):
+        # 并行等待各监控退出，单个卡住的监控最多拖延1秒
+        threads = []
         for obs in self._observer:
-            try: obs.stop(); obs.join()
+            try: obs.stop()
             except: pass
+            t = threading.Thread(target=obs.join, kwargs={"timeout": 1.0}, daemon=True)
+            t.start()
+            threads.append(t)
+        for t in threads:
+            t.join(timeout=1.5)
         self._observer = []
+        if self._event_queue:
+            self._event_queue.put(None)
+            self._event_queue = None
         if self._scheduler:
-            self._scheduler.shutdown()
+            self._scheduler.remove_all_jobs()
+            if self._scheduler.running:
+                self._scheduler.shutdown()
             self._scheduler = None
\ No newline at end of file
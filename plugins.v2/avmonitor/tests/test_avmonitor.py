@@ -0,0 +1,458 @@
+import errno
+import importlib.util
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from watchdog.events import DirCreatedEvent, DirDeletedEvent, DirMovedEvent, FileCreatedEvent, FileDeletedEvent, FileMovedEvent
+
+plugin_file = Path(__file__).resolve().parent.parent / "__init__.py"
+
+
+def _install_app_stubs():
+    """
+    测试环境没有 MoviePilot 主程序，注册插件导入所需的最小 app 模块
+    """
+    if "app" in sys.modules:
+        return
+
+    class _EventManager:
+        @staticmethod
+        def register(*args):
+            return lambda func: func
+
+    class _PluginBase:
+        def update_config(self, config: dict):
+            pass
+
+    class SystemUtils:
+        @staticmethod
+        def link(src: Path, dest: Path):
+            try:
+                dest.hardlink_to(src)
+                return 0, ""
+            except Exception as err:
+                return -1, str(err)
+
+    modules = {
+        "app": {"schemas": None},
+        "app.core": {},
+        "app.core.config": {"settings": types.SimpleNamespace(TZ="UTC")},
+        "app.core.event": {"eventmanager": _EventManager(), "Event": object},
+        "app.log": {"logger": mock.MagicMock()},
+        "app.plugins": {"_PluginBase": _PluginBase},
+        "app.schemas": {"NotificationType": None},
+        "app.schemas.types": {"EventType": types.SimpleNamespace(PluginAction="PluginAction")},
+        "app.utils": {},
+        "app.utils.system": {"SystemUtils": SystemUtils},
+    }
+    for name, attrs in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        sys.modules[name] = module
+
+
+def _load_plugin():
+    _install_app_stubs()
+    spec = importlib.util.spec_from_file_location("avmonitor", plugin_file)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+avmonitor = _load_plugin()
+
+AV_FILES = ["ABC-123.strm", "ABC-123.nfo", "poster.jpg", "fanart.jpg", "thumb.jpg"]
+
+
+class _FakeObserver:
+    """
+    记录 schedule 调用的监控器
+    """
+
+    def __init__(self, timeout=None):
+        self.paths = []
+
+    def start(self):
+        pass
+
+    def schedule(self, handler, path, recursive=False):
+        self.paths.append(path)
+
+
+class TestWatchRoots(unittest.TestCase):
+    """
+    测试监控路径的前缀分发与嵌套路径去重
+    """
+
+    def setUp(self):
+        self.plugin = avmonitor.AvMonitor()
+        self.plugin.init_plugin({"enabled": False})
+
+    def test_match_root_longest_prefix(self):
+        """测试事件路径匹配最长的监控前缀"""
+        targets = ["/a", "/a/b", "/ab", "/c/d/"]
+        self.plugin._watch_roots = sorted((t.rstrip('/') + '/', t) for t in targets)
+        match_root = self.plugin._AvMonitor__match_root
+        self.assertEqual(match_root("/a/x/y.strm"), "/a")
+        self.assertEqual(match_root("/a/b/y.strm"), "/a/b")
+        self.assertEqual(match_root("/a/b"), "/a/b")
+        self.assertEqual(match_root("/ab/z"), "/ab")
+        self.assertEqual(match_root("/c/d/e"), "/c/d/")
+        self.assertIsNone(match_root("/abc/z"))
+        self.assertIsNone(match_root("/c/x"))
+
+    def test_start_monitor_skips_nested_roots(self):
+        """测试已被上级监控路径覆盖的子路径不再重复注册"""
+        with mock.patch.object(avmonitor, "Observer", _FakeObserver), \
+                mock.patch.object(avmonitor, "_get_fs_type", return_value="ext4"):
+            self.plugin._AvMonitor__start_monitor(["/data/src", "/data/src/dst", "/data/other"])
+        self.assertEqual(len(self.plugin._observer), 1)
+        self.assertEqual(self.plugin._observer[0].paths, ["/data/other", "/data/src"])
+        # 被跳过的子路径仍参与分发
+        self.assertEqual(self.plugin._AvMonitor__match_root("/data/src/dst/A/x.json"), "/data/src/dst")
+
+    def test_start_monitor_keeps_nested_root_on_other_observer(self):
+        """测试子路径需要轮询监控时不会被 inotify 的上级路径吞掉"""
+        fs_types = {"/data/src": "ext4", "/data/src/nas": "cifs"}
+        with mock.patch.object(avmonitor, "Observer", _FakeObserver), \
+                mock.patch.object(avmonitor, "PollingObserver", _FakeObserver), \
+                mock.patch.object(avmonitor, "_get_fs_type", side_effect=fs_types.get):
+            self.plugin._AvMonitor__start_monitor(["/data/src", "/data/src/nas"])
+        self.assertEqual([o.paths for o in self.plugin._observer], [["/data/src"], ["/data/src/nas"]])
+
+
+class TestFsType(unittest.TestCase):
+    """
+    测试挂载点文件系统类型识别
+    """
+
+    MOUNTINFO = (
+        "22 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw\n"
+        "40 22 0:35 / /mnt rw,relatime shared:2 - ext4 /dev/sdb1 rw\n"
+        "41 40 0:36 / /mnt/nas\\040share rw,relatime shared:3 - cifs //nas/share rw\n"
+    )
+
+    def _fs_type(self, path: str):
+        with mock.patch.object(avmonitor, "open", mock.mock_open(read_data=self.MOUNTINFO), create=True):
+            return avmonitor._get_fs_type(path)
+
+    def test_longest_prefix(self):
+        """测试按最长前缀匹配挂载点，并识别转义的空格"""
+        self.assertEqual(self._fs_type("/mnt/nas share/actor1"), "cifs")
+        self.assertIn(self._fs_type("/mnt/nas share"), avmonitor._NETWORK_FS_TYPES)
+        self.assertEqual(self._fs_type("/mnt/nas"), "ext4")
+        self.assertEqual(self._fs_type("/mnt/nas shared"), "ext4")
+        self.assertEqual(self._fs_type("/srv/media"), "ext4")
+
+    def test_unreadable_mountinfo(self):
+        """测试无法读取 mountinfo 时返回 None"""
+        with mock.patch.object(avmonitor, "open", side_effect=OSError, create=True):
+            self.assertIsNone(avmonitor._get_fs_type("/mnt"))
+
+
+class _FolderTestCase(unittest.TestCase):
+    """
+    临时源目录/目的目录，事件经真实的处理器与合并线程处理
+    """
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        root = Path(self._tmp.name)
+        self.src = root / "src"
+        self.dst = root / "dst"
+        self.av = self.src / "actor1" / "ABC-123"
+        self.av.mkdir(parents=True)
+        self.dst.mkdir()
+
+        self.plugin = avmonitor.AvMonitor()
+        self.plugin.init_plugin({"enabled": False})
+        self.plugin._dirconf = {str(self.src): self.dst}
+        self.plugin._rev_dirconf = {str(self.dst): self.src}
+        self.plugin._samedev = {str(self.src): True}
+        self.plugin._watch_roots = sorted((str(p) + '/', str(p)) for p in (self.src, self.dst))
+        self.linked = self.dst / "A" / "ABC-123"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _run(self, *events):
+        """把事件交给处理器，再由合并线程作为同一批处理完"""
+        handler = avmonitor.FileMonitorHandler(self.plugin)
+        events_queue = self.plugin._event_queue = queue.Queue()
+        for event in events:
+            handler.dispatch(event)
+        events_queue.put(None)
+        self.plugin._AvMonitor__event_worker(events_queue)
+
+    @staticmethod
+    def _create(folder: Path, *names: str):
+        for name in names:
+            (folder / name).write_text("x")
+        return [FileCreatedEvent(str(folder / name)) for name in names]
+
+    @staticmethod
+    def _move(folder: Path, old: str, new: str):
+        (folder / old).rename(folder / new)
+        return FileMovedEvent(str(folder / old), str(folder / new))
+
+
+class TestFolderReadiness(_FolderTestCase):
+    """
+    测试番号目录就绪状态在创建/删除/移动事件序列下的表现
+    """
+
+    def test_link_when_all_files_created(self):
+        """测试5个文件到齐后完成硬链接"""
+        self._run(*self._create(self.av, *AV_FILES))
+        self.assertEqual(sorted(os.listdir(self.linked)), sorted(AV_FILES))
+
+    def test_incremental_events_after_seed(self):
+        """测试首次扫描后仅靠后续事件补齐"""
+        self._run(*self._create(self.av, *AV_FILES[:3]))
+        self.assertFalse(self.linked.exists())
+        self._run(*self._create(self.av, *AV_FILES[3:]))
+        self.assertTrue(self.linked.exists())
+
+    def test_delete_clears_slot(self):
+        """测试文件被删除后对应槽位失效"""
+        self._run(*self._create(self.av, "ABC-123.strm", "ABC-123.nfo", "poster.jpg", "thumb.jpg"))
+        (self.av / "poster.jpg").unlink()
+        self._run(FileDeletedEvent(str(self.av / "poster.jpg")))
+        self._run(*self._create(self.av, "fanart.jpg"))
+        self.assertFalse(self.linked.exists())
+        self._run(*self._create(self.av, "poster.jpg"))
+        self.assertTrue(self.linked.exists())
+
+    def test_mismatched_strm_nfo_not_linked(self):
+        """测试 strm 与 nfo 不同名时不链接"""
+        self._run(*self._create(self.av, "ABC-123.strm", "OTHER.nfo", *AV_FILES[2:]))
+        self.assertFalse(self.linked.exists())
+
+    def test_moved_file_clears_old_slot(self):
+        """测试文件改名后原文件名的槽位被清除"""
+        self._run(*self._create(self.av, "ABC-123.strm", "ABC-123.nfo", "poster.jpg", "thumb.jpg"))
+        self._run(self._move(self.av, "thumb.jpg", "thumb.old"))
+        self._run(*self._create(self.av, "fanart.jpg"))
+        self.assertFalse(self.linked.exists())
+        self._run(self._move(self.av, "thumb.old", "thumb.jpg"))
+        self.assertEqual(sorted(os.listdir(self.linked)), sorted(AV_FILES))
+
+    def test_moved_dir_drops_stale_state(self):
+        """测试目录改名后旧路径的缓存被丢弃，同名新目录不会继承旧状态"""
+        self._run(*self._create(self.av, *AV_FILES[:4]))
+        renamed = self.av.with_name("ABC-124")
+        self.av.rename(renamed)
+        self._run(DirMovedEvent(str(self.av), str(renamed)))
+        self.assertNotIn(str(self.av), self.plugin._folder_state)
+
+        self.av.mkdir()
+        self._run(*self._create(self.av, "thumb.jpg"))
+        self.assertFalse(self.linked.exists())
+
+    def test_moved_in_dir_is_checked(self):
+        """测试完整目录移入源目录后直接链接"""
+        staging = self.src / "actor1" / ".staging"
+        staging.mkdir()
+        self._create(staging, *AV_FILES)
+        shutil.rmtree(self.av)
+        staging.rename(self.av)
+        self._run(DirMovedEvent(str(staging), str(self.av)))
+        self.assertEqual(sorted(os.listdir(self.linked)), sorted(AV_FILES))
+
+    def test_new_dir_checked_once_per_batch(self):
+        """测试新建目录及其中文件在同一批次内只检查、链接一次"""
+        shutil.rmtree(self.av)
+        self.av.mkdir()
+        events = [DirCreatedEvent(str(self.av))] + self._create(self.av, *AV_FILES)
+        with mock.patch.object(self.plugin, "_process_forward_link",
+                               wraps=self.plugin._process_forward_link) as link:
+            self._run(*events)
+        link.assert_called_once()
+        self.assertEqual(sorted(os.listdir(self.linked)), sorted(AV_FILES))
+
+
+class TestSyncedSnapshot(_FolderTestCase):
+    """
+    测试已处理目录快照
+    """
+
+    def test_delete_before_merge(self):
+        """测试链接后、快照合并前删除的目录不会留在快照中"""
+        self._run(*self._create(self.av, *AV_FILES))
+        self.assertTrue(self.linked.exists())
+        shutil.rmtree(self.av)
+        self._run(DirDeletedEvent(str(self.av)))
+        self.plugin._AvMonitor__merge_synced()
+        self.assertNotIn(str(self.av), self.plugin._synced_snapshot)
+        self.assertFalse(self.linked.exists())
+
+    def test_skips_synced_folder(self):
+        """测试合并进快照后的目录不再重复处理"""
+        self._run(*self._create(self.av, *AV_FILES))
+        self.plugin._AvMonitor__merge_synced()
+        self.assertIn(str(self.av), self.plugin._synced_snapshot)
+        shutil.rmtree(self.linked)
+        self._run(*self._create(self.av, "extra.txt"))
+        self.assertFalse(self.linked.exists())
+
+    def test_folder_replaced_within_window(self):
+        """测试同一防抖窗口内删除并重新创建的目录：旧链接被移除，新文件重新链接"""
+        self._run(*self._create(self.av, *AV_FILES))
+        self.plugin._AvMonitor__merge_synced()
+        shutil.rmtree(self.av)
+        self.av.mkdir()
+        events = [FileDeletedEvent(str(self.av / name)) for name in AV_FILES]
+        events += [DirDeletedEvent(str(self.av)), DirCreatedEvent(str(self.av))]
+        events += self._create(self.av, *AV_FILES)
+        self._run(*events)
+        self.assertEqual((self.linked / "poster.jpg").stat().st_ino, (self.av / "poster.jpg").stat().st_ino)
+        self.plugin._AvMonitor__merge_synced()
+        self.assertIn(str(self.av), self.plugin._synced_snapshot)
+
+
+class TestActorDirCache(_FolderTestCase):
+    """
+    测试演员/分类目录列表缓存
+    """
+
+    def test_json_back_link_finds_actor_added_with_same_mtime(self):
+        """测试基础目录 mtime 未变化时仍能找到新增的演员目录"""
+        json_folder = self.dst / "A" / "ABC-123"
+        json_folder.mkdir(parents=True)
+        self.plugin._list_actor_dirs(self.src)
+
+        st = self.src.stat()
+        new_av = self.src / "actor2" / "ABC-123"
+        shutil.rmtree(self.av)
+        new_av.mkdir(parents=True)
+        os.utime(self.src, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        self._run(*self._create(json_folder, "info.json"))
+        self.assertTrue((new_av / "info.json").exists())
+
+    def test_file_delete_skips_actor_listing(self):
+        """测试源目录单个文件删除不会列出目的端分类目录"""
+        self._create(self.av, "thumb.jpg")
+        (self.av / "thumb.jpg").unlink()
+        with mock.patch.object(self.plugin, "_list_actor_dirs") as list_dirs:
+            self._run(FileDeletedEvent(str(self.av / "thumb.jpg")))
+        list_dirs.assert_not_called()
+
+
+class TestFastRemove(unittest.TestCase):
+    """
+    测试目的端番号目录删除
+    """
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self._tmp.name) / "ABC-123"
+        self.folder.mkdir()
+        for name in AV_FILES:
+            (self.folder / name).write_text("x")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_flat_dir_without_rmtree(self):
+        """测试只含文件的目录直接删除，不走 rmtree"""
+        with mock.patch.object(avmonitor.shutil, "rmtree") as rmtree:
+            avmonitor.AvMonitor._fast_rm_leaf_dir(str(self.folder))
+        rmtree.assert_not_called()
+        self.assertFalse(self.folder.exists())
+
+    def test_subdir_falls_back_to_rmtree(self):
+        """测试含子目录时回退到 rmtree 删除整个目录"""
+        (self.folder / "extrafanart").mkdir()
+        (self.folder / "extrafanart" / "fanart1.jpg").write_text("x")
+        avmonitor.AvMonitor._fast_rm_leaf_dir(str(self.folder))
+        self.assertFalse(self.folder.exists())
+
+
+class TestForwardLink(_FolderTestCase):
+    """
+    测试正向硬链接
+    """
+
+    def test_exdev_marks_failed_and_downgrades_samedev(self):
+        """测试同 st_dev 但 link(2) 返回 EXDEV 时标记失败，并不再按同一设备处理"""
+        self._create(self.av, *AV_FILES)
+        exdev = OSError(errno.EXDEV, "Invalid cross-device link")
+        with mock.patch.object(avmonitor.os, "link", side_effect=exdev):
+            self.assertFalse(self.plugin._process_forward_link(self.av, str(self.src)))
+        self.assertFalse(self.plugin._samedev[str(self.src)])
+        self.assertEqual(os.listdir(self.linked), [])
+
+    def test_letter_dir_recreated_after_external_delete(self):
+        """测试已创建过的分类目录被外部删除后，下次链接时重新创建"""
+        self._create(self.av, *AV_FILES)
+        self.assertTrue(self.plugin._process_forward_link(self.av, str(self.src)))
+        shutil.rmtree(self.dst / "A")
+
+        other = self.src / "actor1" / "ABC-456"
+        other.mkdir()
+        self._create(other, *AV_FILES)
+        self.assertTrue(self.plugin._process_forward_link(other, str(self.src)))
+        self.assertEqual(sorted(os.listdir(self.dst / "A" / "ABC-456")), sorted(AV_FILES))
+
+
+class TestSyncAll(unittest.TestCase):
+    """
+    测试全量同步
+    """
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        root = Path(self._tmp.name)
+        self.src = root / "src"
+        self.dst = root / "dst"
+        self.dst.mkdir()
+        self.plugin = avmonitor.AvMonitor()
+        self.plugin.init_plugin({"enabled": False})
+        self.plugin._dirconf = {str(self.src): self.dst}
+        self.plugin._samedev = {str(self.src): True}
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_sync_all_links_complete_folders_and_skips_unreadable(self):
+        """测试全量同步链接完整目录，无法读取的目录被跳过"""
+        for actor, av in (("actor1", "ABC-123"), ("actor2", "XYZ-9")):
+            folder = self.src / actor / av
+            folder.mkdir(parents=True)
+            for name in [f"{av}.strm", f"{av}.nfo", "poster.jpg", "fanart.jpg", "thumb.jpg"]:
+                (folder / name).write_text("x")
+        (self.src / "actor1" / "DEF-1").mkdir()
+
+        real_scandir = os.scandir
+
+        def scandir(path):
+            if str(path).endswith("DEF-1"):
+                raise PermissionError(errno.EACCES, "Permission denied")
+            return real_scandir(path)
+
+        with mock.patch.object(avmonitor.os, "scandir", side_effect=scandir):
+            self.plugin.sync_all()
+        self.assertTrue((self.dst / "A" / "ABC-123" / "poster.jpg").exists())
+        self.assertTrue((self.dst / "X" / "XYZ-9" / "poster.jpg").exists())
+
+    def test_safe_sync_all_rejects_concurrent_run(self):
+        """测试已有全量同步在运行时，再次触发直接忽略"""
+        with mock.patch.object(self.plugin, "sync_all") as sync_all:
+            with self.plugin._sync_lock:
+                self.plugin._safe_sync_all()
+            sync_all.assert_not_called()
+            self.plugin._safe_sync_all()
+            sync_all.assert_called_once()
+        self.assertFalse(self.plugin._sync_lock.locked())
+
+
+if __name__ == "__main__":
+    unittest.main()